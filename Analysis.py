@@ -1,16 +1,11 @@
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, Result, RoutingControl
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import os
 import scipy.stats as stats
 from dotenv import find_dotenv, load_dotenv
-from sklearn.metrics import r2_score
-from scipy.stats import pearsonr
-from sklearn.linear_model import LinearRegression
-from datetime import datetime, timedelta
 import statsmodels.api as sm
-from scipy.stats import iqr
 
 def get_threat_group_data(driver):
     query = """
@@ -34,25 +29,20 @@ def get_threat_group_data(driver):
                all_related_entities, tool_related_entities, malware_related_entities,
                COUNT(a) AS alias_count
     """
-    with driver.session() as session:
-        results = session.run(query)
-        return results.data()
+    # Build the DataFrame straight from the result instead of going through a list of per-row dicts
+    return driver.execute_query(query, database_="neo4j", routing_=RoutingControl.READ, result_transformer_=Result.to_df)
     
 def fetch_pulse_data(driver):
     '''
-    Retrieve pulses and their creation timestamps from Neo4j.
+    Retrieve pulses and their creation timestamps from Neo4j as a DataFrame.
     '''
 
-    with driver.session() as session:
-        query = """
-        MATCH (tg:ThreatGroup)-[:RELATED_TO]->(p:Pulse)
-        RETURN tg.name AS threat_group, p.created AS pulse_created
-        """
-        
-        result = session.run(query)
-        data = [{"threat_group": record["threat_group"], "pulse_created": record["pulse_created"]} for record in result]
-        
-        return data
+    query = """
+    MATCH (tg:ThreatGroup)-[:RELATED_TO]->(p:Pulse)
+    RETURN tg.name AS threat_group, p.created AS pulse_created
+    """
+    
+    return driver.execute_query(query, database_="neo4j", routing_=RoutingControl.READ, result_transformer_=Result.to_df)
 
 def plot_histograms(df):
     '''
@@ -76,12 +66,15 @@ def plot_histograms(df):
         "All Related Entities", "Tool-Only Related Entities", "Malware-Only Related Entities"
     ]
     
+    # Drop missing values once per column and reuse the arrays for both the statistics and the plots
+    cleaned = {var: df[var].dropna().to_numpy(dtype=float) for var in variables}
+
     for var in variables:
-        data = df[var].dropna()
+        data = cleaned[var]
         if len(data) > 1:
-            median_val = np.median(data)
-            iqr_val = iqr(data)
-            kurtosis_val = stats.kurtosis(data)
+            q1, median_val, q3 = np.percentile(data, [25, 50, 75])
+            iqr_val = q3 - q1
+            kurtosis_val = stats.describe(data).kurtosis
 
             print(f"\nStatistics for {var}:")
             print(f"Median: {median_val:.2f}")
@@ -95,7 +88,7 @@ def plot_histograms(df):
 
     for i, var in enumerate(variables):
         ax = axes[i // 4, i % 4] 
-        data = df[var].dropna()
+        data = cleaned[var]
 
         ax.hist(data, bins=20, alpha=0.7, color='b', edgecolor='black', density=True)
 
@@ -117,18 +110,20 @@ def plot_histograms(df):
 
 def plot_malware_vs_techniques(df):
     plt.figure(figsize=(10, 6))
-    plt.scatter(df['malware_related_entities'], df['ttp_count'], alpha=0.7, label='Threat Groups')
+    plt.scatter(df['malware_related_entities'], df['ttp_count'], alpha=0.7, label='Threat Groups', rasterized=True)
 
-    X = df[['malware_related_entities']]
-    y = df['ttp_count']
-    model = LinearRegression()
-    model.fit(X, y)
-    y_pred = model.predict(X)
+    # linregress cannot fit a line when every x value is identical, so the fit line is skipped instead of aborting
+    if df['malware_related_entities'].nunique() < 2:
+        print("Not enough variation in malware_related_entities to fit a line.")
+    else:
+        # Fit line, correlation and p-value from a single least-squares pass
+        fit = stats.linregress(df['malware_related_entities'], df['ttp_count'])
+        y_pred = fit.intercept + fit.slope * df['malware_related_entities']
 
-    r2 = r2_score(y, y_pred)
-    pearson_corr, p_value = pearsonr(df['malware_related_entities'], df['ttp_count'])
+        r2 = fit.rvalue ** 2
+        pearson_corr, p_value = fit.rvalue, fit.pvalue
 
-    plt.plot(df['malware_related_entities'], y_pred, color='red', linestyle='--', label=f'Best Fit Line (R²={r2:.2f})\nPearson Correlation Coefficient = {pearson_corr:.2f}, P-value = {p_value:.5f}')
+        plt.plot(df['malware_related_entities'], y_pred, color='red', linestyle='--', label=f'Best Fit Line (R²={r2:.2f})\nPearson Correlation Coefficient = {pearson_corr:.2f}, P-value = {p_value:.5f}')
     plt.title("Malware Used vs. Techniques Employed per Threat Group")
     plt.xlabel("Number of Malware Used")
     plt.ylabel("Number of Techniques Used")
@@ -140,22 +135,28 @@ def plot_malwaretools_vs_techniques(df):
 
     scatter = plt.scatter(df['all_related_entities'], df['ttp_count'], 
                           s=df['pulse_count'] * 10,
-                          c=range(len(df)), cmap='viridis', alpha=0.7, edgecolors='k')
+                          c=range(len(df)), cmap='viridis', alpha=0.7, edgecolors='k', rasterized=True)
 
-    X = df[['all_related_entities']]
-    y = df['ttp_count']
-    model = LinearRegression()
-    model.fit(X, y)
-    y_pred = model.predict(X)
+    # linregress cannot fit a line when every x value is identical, so the fit line is skipped instead of aborting
+    if df['all_related_entities'].nunique() < 2:
+        print("Not enough variation in all_related_entities to fit a line.")
+    else:
+        # Fit line, correlation and p-value from a single least-squares pass
+        fit = stats.linregress(df['all_related_entities'], df['ttp_count'])
+        y_pred = fit.intercept + fit.slope * df['all_related_entities']
 
-    r2 = r2_score(y, y_pred)
-    pearson_corr, p_value = pearsonr(df['all_related_entities'], df['ttp_count'])
+        r2 = fit.rvalue ** 2
+        pearson_corr, p_value = fit.rvalue, fit.pvalue
 
-    plt.plot(df['all_related_entities'], y_pred, color='red', linestyle='--', label=f'Best Fit Line (R²={r2:.2f})\nPearson Correlation Coefficient = {pearson_corr:.4f}, P-value = {p_value:.2e}')
+        plt.plot(df['all_related_entities'], y_pred, color='red', linestyle='--', label=f'Best Fit Line (R²={r2:.2f})\nPearson Correlation Coefficient = {pearson_corr:.4f}, P-value = {p_value:.2e}')
 
-    for i, txt in enumerate(df['threat_group']):
-        if df['ttp_count'][i] > np.percentile(df['ttp_count'], 80) or df['all_related_entities'][i] > np.percentile(df['all_related_entities'], 80):
-            plt.annotate(txt, (df['all_related_entities'][i], df['ttp_count'][i]), fontsize=9, alpha=0.8)
+    # Only annotate threat groups above the 80th percentile on either axis
+    ttp_p80 = df['ttp_count'].quantile(0.80)
+    related_p80 = df['all_related_entities'].quantile(0.80)
+    annotate_mask = (df['ttp_count'] > ttp_p80) | (df['all_related_entities'] > related_p80)
+
+    for i in np.flatnonzero(annotate_mask.to_numpy()):
+        plt.annotate(df['threat_group'].iat[i], (df['all_related_entities'].iat[i], df['ttp_count'].iat[i]), fontsize=9, alpha=0.8)
 
     plt.colorbar(scatter, label="Threat Groups")
     plt.title("Threat Group Activity: Tools/Malware vs. TTPs")
@@ -171,20 +172,28 @@ def process_data(df):
     Converts timestamps and identifies inactive/emerging threats.
     Computes PMF for pulse counts per threat group per month.
     """
-    df["pulse_created"] = pd.to_datetime(df["pulse_created"], format='%Y-%m-%dT%H:%M:%S.%f', errors='coerce')
-    df["pulse_created"].fillna(pd.to_datetime(df["pulse_created"], format='%Y-%m-%dT%H:%M:%S', errors='coerce'), inplace=True)
+    # ISO8601 covers timestamps both with and without fractional seconds in a single parse
+    df["pulse_created"] = pd.to_datetime(df["pulse_created"], format='ISO8601', errors='coerce', utc=True)
 
     df = df.dropna(subset=["pulse_created"])
 
     # Group data by month
-    df["year_month"] = df["pulse_created"].dt.to_period("M")
-    df_grouped = df.groupby(["year_month", "threat_group"]).size().reset_index(name="pulse_count")
-
-    df_grouped["year_month"] = df_grouped["year_month"].astype(str)
-
-    # Calculate PMF for pulse counts
-    pmf_pulse_counts = df_grouped.groupby(["year_month", "pulse_count"]).size() / df_grouped.groupby("year_month").size()
-    pmf_pulse_counts = pmf_pulse_counts.reset_index(name="PMF")
+    df["year_month"] = df["pulse_created"].dt.tz_localize(None).dt.to_period("M")
+    df_grouped = df.groupby(["year_month", "threat_group"], observed=True).size().reset_index(name="pulse_count")
+
+    # Calculate PMF for pulse counts - a single bincount over combined (month, pulse count) codes
+    month_codes, months = pd.factorize(df_grouped["year_month"], sort=True)
+    count_codes, counts = pd.factorize(df_grouped["pulse_count"], sort=True)
+    frequencies = np.bincount(
+        month_codes * len(counts) + count_codes, minlength=len(months) * len(counts)
+    ).reshape(len(months), len(counts))
+
+    month_idx, count_idx = np.nonzero(frequencies)
+    pmf_pulse_counts = pd.DataFrame({
+        "year_month": months[month_idx],
+        "pulse_count": counts[count_idx],
+        "PMF": frequencies[month_idx, count_idx] / frequencies.sum(axis=1)[month_idx],
+    })
 
     print("PMF of Pulse Counts per Threat Group per Month:")
     print(pmf_pulse_counts)
@@ -203,22 +212,19 @@ def classify_threats(df):
     EMERGING_FIRST_PULSE_LIMIT = 24  # First pulse must be within the last 24 months (2 years)
     EMERGING_RECENT_PULSE_LIMIT = 24 # Must have activity in the last 12 months (1 year)
 
-    current_date = datetime.now()
-    inactive_threats = []
-    emerging_threats = []
+    current_date = pd.Timestamp.now(tz="UTC")
+    inactive_cutoff = current_date - pd.Timedelta(days=INACTIVE_THRESHOLD_MONTHS * 30)
+    emerging_first_cutoff = current_date - pd.Timedelta(days=EMERGING_FIRST_PULSE_LIMIT * 30)
+    emerging_recent_cutoff = current_date - pd.Timedelta(days=EMERGING_RECENT_PULSE_LIMIT * 30)
 
-    for threat_group, group_data in df.groupby("threat_group"):
-        first_seen = group_data["pulse_created"].min()
-        last_seen = group_data["pulse_created"].max()
+    # First and last pulse per threat group in a single aggregation
+    activity = df.groupby("threat_group", observed=True)["pulse_created"].agg(first_seen="min", last_seen="max")
 
-        if last_seen < (current_date - timedelta(days=INACTIVE_THRESHOLD_MONTHS * 30)):  
-            inactive_threats.append(threat_group)
+    inactive = activity["last_seen"] < inactive_cutoff
+    emerging = ~inactive & (activity["first_seen"] > emerging_first_cutoff) & (activity["last_seen"] > emerging_recent_cutoff)
 
-        elif (
-            first_seen > (current_date - timedelta(days=EMERGING_FIRST_PULSE_LIMIT * 30)) and
-            last_seen > (current_date - timedelta(days=EMERGING_RECENT_PULSE_LIMIT * 30))
-        ):
-            emerging_threats.append(threat_group)
+    inactive_threats = activity.index[inactive].tolist()
+    emerging_threats = activity.index[emerging].tolist()
 
     return inactive_threats, emerging_threats
 
@@ -237,7 +243,8 @@ def plot_threats(df, threat_list, title):
         print(f"No data available for {title} threats.")
         return
 
-    df_pivot = df_filtered.pivot(index="year_month", columns="threat_group", values="pulse_count").fillna(0)
+    # year_month stays a Period so months sort chronologically, and unstack reuses the existing group codes
+    df_pivot = df_filtered.set_index(["year_month", "threat_group"])["pulse_count"].unstack(fill_value=0)
 
     fig, ax = plt.subplots(figsize=(14, 7))
     df_pivot.plot(kind="line", marker="o", ax=ax)
@@ -261,26 +268,33 @@ def detect_outliers(df, columns):
     Returns:
         tuple: A cleaned DataFrame without outliers, and a dictionary of outliers for each column.
     """
-    outliers_dict = {} 
-    outlier_indices = set()
+    numeric_cols = []
 
     for col in columns:
         if not pd.api.types.is_numeric_dtype(df[col]):
             print(f"Skipping non-numeric column: {col}")
             continue
+        numeric_cols.append(col)
+
+    outliers_dict = {}
+
+    if not numeric_cols:
+        return df.copy(), outliers_dict
+
+    # Quartiles and bounds for every column at once, then a single broadcasted comparison
+    values = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+    Q1, Q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+    IQR = Q3 - Q1
+    lower_bound = Q1 - 1.5 * IQR
+    upper_bound = Q3 + 1.5 * IQR
 
-        Q1 = df[col].quantile(0.25)
-        Q3 = df[col].quantile(0.75)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
+    outlier_mask = (values < lower_bound) | (values > upper_bound)
 
-        outliers = df[(df[col] < lower_bound) | (df[col] > upper_bound)]
-        if not outliers.empty:
-            outliers_dict[col] = outliers
-            outlier_indices.update(outliers.index)
+    for j, col in enumerate(numeric_cols):
+        if outlier_mask[:, j].any():
+            outliers_dict[col] = df[outlier_mask[:, j]]
 
-    df_clean = df.drop(index=list(outlier_indices))
+    df_clean = df[~outlier_mask.any(axis=1)]
 
     return df_clean, outliers_dict
 
@@ -322,26 +336,28 @@ def main():
 
     with GraphDatabase.driver(URI, auth=AUTH) as driver:
         print("Fetching threat group data from Neo4j...")
-        threat_data = get_threat_group_data(driver)
-        pulse_data = fetch_pulse_data(driver)
-        df = pd.DataFrame(threat_data)
+        df = get_threat_group_data(driver)
+        pulse_df = fetch_pulse_data(driver)
 
         if df.empty:
             print("No threat group data found!")
             return
 
+        # Group names repeat across rows, so categorical codes make the later groupby/isin/pivot calls integer-based
+        df["threat_group"] = df["threat_group"].astype("category")
+
         plot_histograms(df)
         plot_malware_vs_techniques(df)
         plot_malwaretools_vs_techniques(df)
         plot_ols_regression(df)
 
-        df = pd.DataFrame(pulse_data)
-        
-        if df.empty:
+        if pulse_df.empty:
             print("No pulse data found!")
             return
+
+        pulse_df["threat_group"] = pulse_df["threat_group"].astype("category")
         
-        df_grouped, df = process_data(df)
+        df_grouped, df = process_data(pulse_df)
         inactive_threats, emerging_threats = classify_threats(df)
         plot_threats(df_grouped, inactive_threats, "Inactive")
         plot_threats(df_grouped, emerging_threats, "Emerging")
@@ -1,36 +1,79 @@
-import json
+import os
+import re
+import orjson
+
+# The boundary between two dictionaries - the carriage return is optional so dumps saved with Windows line endings split too
+BOUNDARY = re.compile(rb'}\r?\n{')
+
+def iter_objects(input_file, chunk_size=1 << 20):
+    '''
+    The PulseDive data is stored as seperate dictionaries, one after another, without commas. Rather than loading the whole file,
+    this reads it in chunks and splits on the closing brace, line ending and opening brace between two dictionaries, yielding each dictionary's bytes as soon as it is complete.
+    Only the current chunk and the unfinished dictionary are held in memory.
+    '''
+    buffer = bytearray()
+
+    with open(input_file, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            # Only the newly read bytes need searching, plus a few old ones in case a boundary straddles two chunks
+            search_from = max(len(buffer) - 3, 0)
+            buffer += chunk
+
+            start = 0
+            for match in BOUNDARY.finditer(buffer, search_from):
+                # Keep the closing brace with this dictionary and the opening brace with the next one
+                yield bytes(buffer[start:match.start() + 1])
+                start = match.end() - 1
+
+            if start:
+                del buffer[:start]
+
+    if buffer.strip():
+        yield bytes(buffer)
 
 def fix_json_file(input_file, output_file):
+    temp_file = output_file + '.tmp'
+
     try:
-        with open(input_file, 'r') as file:
-            raw_data = file.read()
-        
         '''
-        I found that the PulseDive data i collected was stored as seperate dictionaries, without commas. This code reads the contents of the file.
-        It then preprocess the data by wrapping objects in a list and separate them with commas . 
+        Each dictionary is validated and written out on its own, wrapped in a list and separated with commas.
+        An error is printed if one of them is invalid JSON.
         '''
-        fixed_data = '[\n' + raw_data.replace('}\n{', '},\n{') + '\n]'
+        valid = True
+
+        with open(temp_file, 'wb') as out:
+            out.write(b'[\n')
+
+            for i, obj_bytes in enumerate(iter_objects(input_file)):
+                try:
+                    record = orjson.loads(obj_bytes)
+                except orjson.JSONDecodeError as e:
+                    print(f"Error validating JSON: {e}")
+                    valid = False
+                    break
+
+                if i > 0:
+                    out.write(b',\n')
+                out.write(orjson.dumps(record, option=orjson.OPT_INDENT_2))
+
+            out.write(b'\n]')
 
         '''
-        The data is then validated to ensure it is in proper JSON format. An error is printed if the JSON is still invalid.
+        The output is written to a temporary file first, and only replaces the output file once every dictionary was valid
         '''
-        try:
-            json_data = json.loads(fixed_data)
-        except json.JSONDecodeError as e:
-            print(f"Error validating JSON: {e}")
+        if not valid:
             return
 
-        '''
-        The contents is then written to the output file with proper formatting
-        '''
-        with open(output_file, 'w') as file:
-            file.write(json.dumps(json_data, indent=4))
-        
+        os.replace(temp_file, output_file)
         print(f"Successfully fixed and saved the JSON to '{output_file}'.")
     except Exception as e:
         print(f"An error occurred: {e}")
+    finally:
+        # The temporary file is only left over when the output was not replaced
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
 
 input_file = 'PulsediveInfo_Unformatted.json'
 output_file = 'PulsediveInfo.json'
 
-fix_json_file(input_file, output_file)
\ No newline at end of file
+fix_json_file(input_file, output_file)
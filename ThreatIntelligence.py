@@ -1,256 +1,332 @@
 import shutil
 import os
-import json
+import orjson
+import ijson
 
-from stix2 import MemoryStore, parse, Filter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from git import Repo # GitPython module
 from neo4j import GraphDatabase
 from OTXv2 import OTXv2
 from dotenv import find_dotenv, load_dotenv
 
-def reset_permissions(path):
+# The .env file is located and loaded, and the OTX client created, once per process rather than once per threat group
+load_dotenv(find_dotenv())
+OTX = OTXv2(os.getenv("OTX_API_KEY"))
+
+# Cypher statements are kept as constants so every call sends identical, parameterised query text and reuses the cached plan
+CY_CREATE_INDEXES = [
+    "CREATE CONSTRAINT threat_group_name_unique IF NOT EXISTS FOR (tg:ThreatGroup) REQUIRE tg.name IS UNIQUE",
+    "CREATE CONSTRAINT alias_name_unique IF NOT EXISTS FOR (a:Alias) REQUIRE a.name IS UNIQUE",
+    "CREATE CONSTRAINT country_code_unique IF NOT EXISTS FOR (c:Country) REQUIRE c.code IS UNIQUE",
+    "CREATE CONSTRAINT related_entity_tid_unique IF NOT EXISTS FOR (re:RelatedEntity) REQUIRE re.tid IS UNIQUE",
+    "CREATE INDEX pulse_name_group IF NOT EXISTS FOR (p:Pulse) ON (p.name, p.group)",
+    "CREATE INDEX tactic_name_group IF NOT EXISTS FOR (t:Tactic) ON (t.name, t.group)",
+    "CREATE INDEX technique_name_group IF NOT EXISTS FOR (tech:Technique) ON (tech.name, tech.group)",
+]
+
+CY_DELETE_ALL = "MATCH (n) DETACH DELETE n"
+
+CY_MERGE_THREAT_GROUPS = (
+    "UNWIND $rows AS row "
+    "MERGE (tg:ThreatGroup {name: row.name}) "
+    "SET tg.description = row.description "
+    "WITH tg, row "
+    "UNWIND row.aliases AS alias "
+    "MERGE (a:Alias {name: alias}) "
+    "MERGE (tg)-[:HAS_ALIAS]->(a)"
+)
+
+# Create the Pulse nodes with additional properties and link ThreatGroup -> Pulse
+CY_MERGE_PULSES = (
+    "UNWIND $rows AS row "
+    "MERGE (p:Pulse {name: row.name, group: $group_name}) "
+    "ON CREATE SET p.createdBy = $group_name, "
+    "               p.id = row.id, "
+    "               p.description = row.description, "
+    "               p.created = row.created, "
+    "               p.malware_families = row.malware_families, "
+    "               p.targeted_countries = row.targeted_countries, "
+    "               p.industries = row.industries "
+    "ON MATCH SET p.group = COALESCE(p.group, $group_name), "
+    "               p.description = row.description, "
+    "               p.created = row.created, "
+    "               p.malware_families = row.malware_families, "
+    "               p.targeted_countries = row.targeted_countries, "
+    "               p.industries = row.industries "
+    "WITH p "
+    "MATCH (tg:ThreatGroup {name: $group_name}) "
+    "MERGE (tg)-[:RELATED_TO]->(p)"
+)
+
+# Store the country code and link it to the threat group
+CY_MERGE_COUNTRY = (
+    "MERGE (c:Country {code: $code}) "
+    "WITH c "
+    "MATCH (tg:ThreatGroup {name: $group_name}) "
+    "MERGE (tg)-[:ORIGINATES_FROM]->(c)"
+)
+
+# Store related entities (tools, malware, campaigns, etc.) and link them to the threat group
+CY_MERGE_RELATED_ENTITIES = (
+    "MATCH (tg:ThreatGroup {name: $group_name}) "
+    "UNWIND $entities AS entity "
+    "MERGE (re:RelatedEntity {tid: entity.tid}) "
+    "SET re.name = entity.name, re.category = entity.category, re.risk = entity.risk "
+    "MERGE (tg)-[:USES]->(re)"
+)
+
+# Create unique tactic and technique nodes for each group and link ThreatGroup -> Tactic -> Technique
+CY_MERGE_TTPS = (
+    "MATCH (tg:ThreatGroup {name: $group_name}) "
+    "UNWIND $ttps AS row "
+    "MERGE (t:Tactic {name: row.tactic, group: $group_name}) "
+    "ON CREATE SET t.createdBy = $group_name "
+    "ON MATCH SET t.group = COALESCE(t.group, $group_name) "
+    "MERGE (tg)-[:USES]->(t) "
+    "WITH t, row "
+    "UNWIND row.techniques AS technique "
+    "MERGE (tech:Technique {name: technique, group: $group_name}) "
+    "ON CREATE SET tech.createdBy = $group_name "
+    "ON MATCH SET tech.group = COALESCE(tech.group, $group_name) "
+    "MERGE (t)-[:USES]->(tech)"
+)
+
+def remove_readonly(func, path, exc_info):
     """
-    Recursively sets permissions to 777 for all files and directories starting from the specified path.
-    This makes all files and directories readable, writable, and executable by everyone - only used for this folder specifically to clear the outdated Github Repo
+    Error handler for shutil.rmtree. Git marks some files in the cloned repo as read-only, which stops them from being deleted on Windows.
+    Only when a removal fails is the path's permission set to 777 and the removal retried, rather than walking the whole tree up front.
     """
-    for root, dirs, files in os.walk(path):
-        for name in files:
-            os.chmod(os.path.join(root, name), 0o777)
-        for name in dirs:
-            os.chmod(os.path.join(root, name), 0o777)
+    os.chmod(path, 0o777)
+    func(path)
 
-def store_threat_groups(driver, threat_groups):
+def create_indexes(session):
     """
-    Creates or updates threat group nodes in a Neo4j database. Deletes all existing data before inserting new threat groups.
+    Creates indexes on the properties used as MERGE keys, so each MERGE is an index seek rather than a full label scan.
+    Nodes merged on a single identifying property get a uniqueness constraint, which is backed by an index and also stops
+    concurrent workers from creating duplicates. Composite indexes are used where a MERGE matches on more than one property.
+
+    Parameters:
+    - session: Neo4j session used for the schema queries.
+    """
+    for query in CY_CREATE_INDEXES:
+        session.run(query)
+
+def clear_database(session):
+    """
+    Deletes all existing data from the database. This runs before the indexes and constraints are created,
+    so duplicate nodes left by older runs cannot stop a uniqueness constraint from being created.
+
+    Parameters:
+    - session: Neo4j session used for the delete.
+    """
+    session.run(CY_DELETE_ALL).consume()
+    print("All data has been deleted from the database.")
+
+def store_threat_groups(session, threat_groups):
+    """
+    Creates or updates threat group nodes in a Neo4j database.
     
     Parameters:
-    - driver: Neo4j database driver instance.
+    - session: Neo4j session used for the writes.
     - threat_groups: List of dictionaries containing threat group data - taken from MITRE Github repo.
     """
-    with driver.session() as session:
-        session.run("MATCH (n) DETACH DELETE n")
-        print("All data has been deleted from the database.")
-        
-        for group in threat_groups:
-            session.run(
-                """
-                MERGE (tg:ThreatGroup {name: $name})
-                SET tg.description = $description
-                WITH tg
-                UNWIND $aliases AS alias
-                MERGE (a:Alias {name: alias})
-                MERGE (tg)-[:HAS_ALIAS]->(a)
-                """,
-                name=group.get("name", "Unknown"),
-                description=group.get("description", "No description available."),
-                aliases=group.get("aliases", [])
-            )
+    rows = [
+        {
+            "name": group.get("name", "Unknown"),
+            "description": group.get("description", "No description available."),
+            "aliases": group.get("aliases", []),
+        }
+        for group in threat_groups
+    ]
+
+    # All threat groups and their aliases are stored by one query in a single transaction
+    session.execute_write(lambda tx: tx.run(CY_MERGE_THREAT_GROUPS, rows=rows).consume())
+
+def prepare_pulse_rows(pulses):
+    """
+    Converts the OTX pulse search response into the parameter rows written by store_pulses.
+    This runs before the transaction is opened, so a retried transaction does not rebuild the rows.
+
+    Parameters:
+    - pulses: Dictionary containing pulse data from AlienVault OTX.
+
+    Returns:
+    - rows: List of dictionaries holding each pulse's properties - empty if there are no pulses.
+    """
+    results = pulses.get('results')
 
-def store_pulses(driver, group_name, pulses):
+    # Check the 'results' key contains a valid list of pulses
+    if not isinstance(results, list):
+        print("Invalid response format.")
+        return []
+
+    # Accesses the pulse details safely - setting to N/A if variable not found
+    return [
+        {
+            "id": pulse.get('id', 'N/A'),
+            "name": pulse.get('name', 'N/A'),
+            "created": pulse.get('created', 'N/A'),
+            "description": pulse.get('description', 'No description available.'),
+            "malware_families": pulse.get('malware_families', 'N/A'),
+            "targeted_countries": pulse.get('targeted_countries', 'N/A'),
+            "industries": pulse.get('industries', 'N/A'),
+        }
+        for pulse in results
+    ]
+
+def store_pulses(tx, group_name, pulse_rows):
     """
     Stores pulse data in a Neo4j database and links it to threat groups.
+    All pulses for the group are sent as one parameter list and written with a single UNWIND query.
     
     Parameters:
-    - driver: Neo4j database driver instance.
+    - tx: Neo4j transaction the writes are run in.
     - group_name: Name of the threat group being stored.
-    - pulses: Dictionary containing pulse data from PulsediveInfo.json
+    - pulse_rows: List of pulse property dictionaries built by prepare_pulse_rows.
     """
-    # Check if 'results' key exists and contains a valid list and loops through the pulses
-    if 'results' in pulses and isinstance(pulses['results'], list):
-        if len(pulses['results']) != 0:            
-            for pulse in pulses['results']:
-                # Accesses the pulse details safely - setting to N/A if variable not found
-                pulse_id = pulse.get('id', 'N/A')
-                pulse_name = pulse.get('name', 'N/A')
-                pulse_created = pulse.get('created', 'N/A')
-                pulse_description = pulse.get('description', 'No description available.')
-                pulse_malware_families = pulse.get('malware_families', 'N/A')
-                pulse_targeted_countries = pulse.get('targeted_countries', 'N/A')
-                pulse_industries = pulse.get('industries', 'N/A')
-                
-                with driver.session() as session:
-                    # Create the Pulse node with additional properties
-                    query_pulse = (
-                        "MERGE (p:Pulse {name: $pulse_name, group: $group_name}) "
-                        "ON CREATE SET p.createdBy = $group_name, "
-                        "               p.id = $pulse_id, "
-                        "               p.description = $pulse_description, "
-                        "               p.created = $pulse_created, "
-                        "               p.malware_families = $pulse_malware_families, "
-                        "               p.targeted_countries = $pulse_targeted_countries, "
-                        "               p.industries = $pulse_industries "
-                        "ON MATCH SET p.group = COALESCE(p.group, $group_name), "
-                        "               p.description = $pulse_description, "
-                        "               p.created = $pulse_created, "
-                        "               p.malware_families = $pulse_malware_families, "
-                        "               p.targeted_countries = $pulse_targeted_countries, "
-                        "               p.industries = $pulse_industries"
-                    )
-                    session.run(query_pulse, {
-                        "pulse_name": pulse_name,
-                        "group_name": group_name,
-                        "pulse_id": pulse_id,
-                        "pulse_description": pulse_description,
-                        "pulse_created": pulse_created,
-                        "pulse_malware_families": pulse_malware_families,
-                        "pulse_targeted_countries": pulse_targeted_countries,
-                        "pulse_industries": pulse_industries,
-                    })
-
-                    # Link ThreatGroup -> Pulse
-                    query_pulse_link = (
-                        "MATCH (tg:ThreatGroup {name: $group_name}), (p:Pulse {name: $pulse_name, group: $group_name}) "
-                        "MERGE (tg)-[:RELATED_TO]->(p)"
-                    )
-                    session.run(query_pulse_link, {
-                        "group_name": group_name,
-                        "pulse_name": pulse_name
-                    })
-    else:
-        print("Invalid response format.")
+    if not pulse_rows:
+        return
+
+    tx.run(CY_MERGE_PULSES, rows=pulse_rows, group_name=group_name)
 
-def fetch_pulsedive_info(driver, group_name):
+def normalise_group_name(name):
     """
-    Fetches Pulsedive threat intelligence information and stores relevant details. It starts by loading the JSON file containing Pulsedive threat intelligence data
-    We then ensure it is a list of records and iterate over each record. The necessary fields are extracted. 
-    The threat group's name checks if it matches the given group name. The extracted data is then stored into the database.
+    Returns the key used to match threat group names, so names differing only in case or surrounding whitespace are treated as the same group.
+    """
+    return name.strip().lower()
+
+def load_pulsedive_index(path='PulsediveInfo.json'):
+    """
+    Loads the JSON file containing Pulsedive threat intelligence data once and indexes it for lookups by threat group.
+    Only the fields that are stored are kept - the related entities, country codes and TTPs - so the rest of each record can be freed.
+    Each entry is stored under its record's normalised threat name and each of its normalised other names, so a group can be found with a single dictionary lookup.
 
     Parameters:
-    - driver: Neo4j database driver instance.
-    - group_name: Name of the threat group to match in the Pulsedive data.
+    - path: Path to the Pulsedive JSON file.
+
+    Returns:
+    - index: Dictionary mapping normalised names to a list of (related entities, country codes, ttps) tuples.
     """
 
-    with open('PulsediveInfo.json', 'r') as file:
-        data = json.load(file)
-    
+    with open(path, 'rb') as file:
+        data = orjson.loads(file.read())
+
+    index = {}
+
     if isinstance(data, list):
         for record in data:
-            name = record.get("threat")
-            othernames = record.get("othernames", [])
-            othernames = [name.lower() for name in othernames]
+            attributes = record.get("attributes", {})
+
+            if not isinstance(attributes, dict):
+                continue
+
+            # Sorted by tid so the shared RelatedEntity nodes are always locked in the same order
+            related_entities = sorted(
+                (
+                    {
+                        "tid": entity["tid"],
+                        "name": entity["name"],
+                        "category": entity["category"],
+                        "risk": entity["risk"],
+                    }
+                    for entity in record.get("related", [])
+                ),
+                key=lambda entity: entity["tid"],
+            )
+            info = (related_entities, attributes.get("countrycode", []), record.get("ttps", {}))
+
+            names = [record.get("threat") or ""] + record.get("othernames", [])
+
+            for name in set(normalise_group_name(name) for name in names):
+                index.setdefault(name, []).append(info)
 
-            if name.lower() == group_name.lower() or group_name.lower() in othernames:
-                related_entities = record.get("related", [])
-                attributes = record.get("attributes", {})
-                ttps = record.get("ttps", {})
+    return index
 
-                if not isinstance(attributes, dict):
-                    continue
-                else:
-                    country_codes = attributes.get("countrycode", [])
+def fetch_pulsedive_info(group_name, pd_index):
+    """
+    Fetches Pulsedive threat intelligence information for a threat group, matching the threat group's name
+    or one of its other names with a single lookup in the pre-built index.
 
-                store_pulsedive_info(driver, group_name, related_entities, country_codes, ttps)
+    Parameters:
+    - group_name: Name of the threat group to match in the Pulsedive data.
+    - pd_index: Index of Pulsedive records built by load_pulsedive_index.
 
-def store_pulsedive_info(driver, group_name, related, country, ttps):
+    Returns:
+    - pulsedive_info: List of (related entities, country codes, ttps) tuples, one per matching record.
+    """
+
+    return pd_index.get(normalise_group_name(group_name), [])
+
+def store_pulsedive_info(tx, group_name, pulsedive_info):
     """
     Stores Pulsedive threat intelligence information into a Neo4j database. 
     This includes linking threat groups to country codes, related entities, and TTPs (tactics, techniques, and procedures).
+    Related entities and TTPs are each written with a single batched UNWIND query rather than one query per item.
+
+    RelatedEntity and Country nodes are shared between threat groups that are written concurrently, so every transaction
+    takes their locks in the same order - entities from all of the group's records first, in tid order, then countries in code order.
+    Two workers can then never hold each other's locks, which would otherwise end in deadlock retries.
 
     Parameters:
-    - driver: Neo4j database driver instance.
+    - tx: Neo4j transaction the writes are run in.
     - group_name: Name of the threat group.
-    - related: List of related entities (tools, malware, campaigns, etc.).
-    - country: List of country codes associated with the threat group.
-    - ttps: Dictionary containing tactics as keys and their respective techniques as values.
+    - pulsedive_info: List of (related entities, country codes, ttps) tuples returned by fetch_pulsedive_info.
     """
-    with driver.session() as session:
-        # Store country codes
-        if len(country) > 0:
-            query = "MERGE (c:Country {code: $code})"
-            session.run(query, {"code": country[0]})
-
-            # Link country codes to threat group
-            query_link_country = (
-                "MATCH (tg:ThreatGroup {name: $group_name}), (c:Country {code: $code}) "
-                "MERGE (tg)-[:ORIGINATES_FROM]->(c)"
-            )
-            session.run(query_link_country, {
-                "group_name": group_name,
-                "code": country[0]
-            })
-        
-        # Store related entities (tools, malware, campaigns, etc.)
-        for entity in related:
-            query = (
-                "MERGE (re:RelatedEntity {tid: $tid, name: $name, category: $category, risk: $risk})"
-            )
-            session.run(query, {
-                "tid": entity["tid"],
-                "name": entity["name"],
-                "category": entity["category"],
-                "risk": entity["risk"],
-            })
-
-            # Link entities to threat group
-            query_link_entity = (
-                "MATCH (tg:ThreatGroup {name: $group_name}), (re:RelatedEntity {tid: $tid}) "
-                "MERGE (tg)-[:USES]->(re)"
-            )
-            session.run(query_link_entity, {
-                "group_name": group_name,
-                "tid": entity["tid"]
-            })
-
-        # Store TTPs
-        for tactic_name, technique_list in ttps.items():
-            # Create a unique tactic node for each group
-            query_tactic = (
-                "MERGE (t:Tactic {name: $name, group: $group_name}) "
-                "ON CREATE SET t.createdBy = $group_name "
-                "ON MATCH SET t.group = COALESCE(t.group, $group_name)"
-            )
-            session.run(query_tactic, {"name": tactic_name, "group_name": group_name})
-    
-            # Link ThreatGroup -> Tactic
-            query_tactic_link = (
-                "MATCH (tg:ThreatGroup {name: $group_name}), (t:Tactic {name: $tactic_name, group: $group_name}) "
-                "MERGE (tg)-[:USES]->(t)"
-            )
-            session.run(query_tactic_link, {
-                "group_name": group_name,
-                "tactic_name": tactic_name
-            })
-
-            # Ensure technique_list is valid
-            if isinstance(technique_list, list) and technique_list:
-                for technique in technique_list:
-                    # Create unique techniques for each group's tactics
-                    query_technique = (
-                        "MERGE (tech:Technique {name: $name, group: $group_name}) "
-                        "ON CREATE SET tech.createdBy = $group_name "
-                        "ON MATCH SET tech.group = COALESCE(tech.group, $group_name)"
-                    )
-                    session.run(query_technique, {"name": technique, "group_name": group_name})
-
-                    # Link Tactic -> Technique
-                    query_tactic_technique_link = (
-                        "MATCH (t:Tactic {name: $tactic_name, group: $group_name}), (tech:Technique {name: $technique_name, group: $group_name}) "
-                        "MERGE (t)-[:USES]->(tech)"
-                    )
-                    session.run(query_tactic_technique_link, {
-                        "tactic_name": tactic_name,
-                        "technique_name": technique,
-                        "group_name": group_name
-                    })
+    # Store related entities (tools, malware, campaigns, etc.) - merged across records by tid and sorted so locks are taken in tid order
+    related = {entity["tid"]: entity for entities, _, _ in pulsedive_info for entity in entities}
+    if related:
+        entities = [related[tid] for tid in sorted(related)]
+        tx.run(CY_MERGE_RELATED_ENTITIES, entities=entities, group_name=group_name)
+
+    # Store country codes
+    for code in sorted({country[0] for _, country, _ in pulsedive_info if country}):
+        tx.run(CY_MERGE_COUNTRY, code=code, group_name=group_name)
+
+    # Store TTPs - tactics with an invalid technique list are still stored, just without techniques
+    for _, _, ttps in pulsedive_info:
+        if ttps:
+            tactics = [
+                {"tactic": tactic_name, "techniques": technique_list if isinstance(technique_list, list) else []}
+                for tactic_name, technique_list in ttps.items()
+            ]
+            tx.run(CY_MERGE_TTPS, ttps=tactics, group_name=group_name)
+
+def store_group_intel(tx, group_name, pulsedive_info, pulse_rows):
+    """
+    Transaction function storing everything gathered for one threat group, so the Pulsedive and OTX writes share a single commit
+    and are retried together on transient errors.
+
+    Parameters:
+    - tx: Neo4j transaction the writes are run in.
+    - group_name: Name of the threat group.
+    - pulsedive_info: List of (related entities, country codes, ttps) tuples returned by fetch_pulsedive_info.
+    - pulse_rows: List of pulse property dictionaries built by prepare_pulse_rows.
+    """
+    store_pulsedive_info(tx, group_name, pulsedive_info)
+    store_pulses(tx, group_name, pulse_rows)
 
 def download_repo():
     """
-    Clones the MITRE ATT&CK STIX data repository into the local 'cti' directory. 
-    If the directory already exists, it resets permissions and deletes it before downloading the latest version.
+    Downloads the MITRE ATT&CK STIX data repository into the local 'cti' directory.
+    If the directory already exists, only the latest changes are pulled. If the pull fails, it deletes it before downloading a fresh shallow clone.
     """
 
     cti_path = 'c:/Users/Rumaan/Documents/SCC Work/SCC300/cti'
-    reset_permissions(cti_path)
 
     if os.path.exists(cti_path):
-        shutil.rmtree(cti_path)
+        try:
+            Repo(cti_path).remotes.origin.pull()
+            return
+        except Exception as e:
+            print(f"Could not update the existing repository, downloading it again: {e}")
+            shutil.rmtree(cti_path, onerror=remove_readonly)
 
-    Repo.clone_from("https://github.com/mitre-attack/attack-stix-data.git", "cti")
+    Repo.clone_from("https://github.com/mitre-attack/attack-stix-data.git", "cti", depth=1, single_branch=True)
 
 def fetch_pulses(group_name):
     """
-    Automatically locates and load the .env file. The OTX API key is retrieved from the environment variables.
-    We then initialize the OTX API client and query the API for pulses related to the given group name. The fetched pulses are returned.
+    Queries the AlienVault OTX API for pulses related to the given group name, using the shared OTX client. The fetched pulses are returned.
     
     Parameters:
     - group_name: Name of the threat group to search for in OTX pulses.
@@ -259,49 +335,71 @@ def fetch_pulses(group_name):
     - pulses: JSON response containing relevant threat intelligence pulses.
     """
 
-    dotenv_path = find_dotenv()
-    load_dotenv(dotenv_path)
-    OTX_API_KEY = os.getenv("OTX_API_KEY")
-    otx = OTXv2(OTX_API_KEY)
-    pulses = otx.search_pulses(group_name)
-    return pulses    
-    
+    return OTX.search_pulses(group_name)
+
+def process_threat_group(driver, group_names, pd_index):
+    """
+    Fetches and stores the Pulsedive and AlienVault OTX data for every spelling of a single threat group.
+    Runs on a worker thread, so the blocking OTX request of one group overlaps with the work of the others.
+    Spellings that only differ in case or surrounding whitespace return the same data, so it is fetched once and stored
+    against each spelling's ThreatGroup node.
+    Sessions are not thread safe, so each group opens its own session and writes each spelling's data in one transaction.
+
+    Parameters:
+    - driver: Neo4j database driver instance, shared between worker threads.
+    - group_names: Spellings of the threat group's name, all sharing the same normalised name.
+    - pd_index: Index of Pulsedive records built by load_pulsedive_index.
+    """
+    pulsedive_info = fetch_pulsedive_info(group_names[0], pd_index)
+    pulse_rows = prepare_pulse_rows(fetch_pulses(group_names[0]))
+
+    with driver.session(database="neo4j") as session:
+        for group_name in group_names:
+            session.execute_write(store_group_intel, group_name, pulsedive_info, pulse_rows)
+            print(f"Added all data for {group_name}")
+
 def store_threat_group_data():
     """
-    Loads environment variables from the .env file and retrieves database credentials and API keys.
+    Retrieves the database credentials from the environment variables loaded from the .env file.
     We then establish a connection to the Neo4j database and stores threat group data.
-    Additional data is fetched from Pulsedive and AlienVault OTX and stored into the database.
+    Additional data is fetched from Pulsedive and AlienVault OTX and stored into the database, processing several threat groups in parallel.
     """
 
-    dotenv_path = find_dotenv()
-    load_dotenv(dotenv_path)
     URI = "bolt://localhost:7687"
     DB_USER = os.getenv("DB_USER")
     DB_PASS = os.getenv("DB_PASS")
-    OTX_API_KEY = os.getenv("OTX_API_KEY")
     AUTH = (DB_USER, DB_PASS)
 
-    with GraphDatabase.driver(URI, auth=AUTH) as driver:
+    # The connection pool is sized above the worker count so no thread waits on a free connection,
+    # and a bounded acquisition timeout makes an exhausted pool fail loudly instead of hanging
+    MAX_WORKERS = 16
+
+    with GraphDatabase.driver(
+        URI,
+        auth=AUTH,
+        max_connection_pool_size=2 * MAX_WORKERS,
+        connection_acquisition_timeout=60,
+    ) as driver:
         driver.verify_connectivity()
         print("Successfully Connected")
-        store_threat_groups(driver, threat_groups,)
+        with driver.session(database="neo4j") as session:
+            clear_database(session)
+            create_indexes(session)
+            store_threat_groups(session, threat_groups)
         print("Threat groups successfully stored in Neo4j!")
 
-        alreadyAccessed = {}
-
+        # Spellings are grouped by normalised name so each group's OTX and Pulsedive data is only fetched once
+        group_names = {}
         for group in threat_groups:
-            group_name = group.get("name", "Unknown")
-
-            if group_name in alreadyAccessed:
-                continue
+            name = group.get("name", "Unknown")
+            spellings = group_names.setdefault(normalise_group_name(name), [])
+            if name not in spellings:
+                spellings.append(name)
 
-            alreadyAccessed[group_name] = True
-            fetch_pulsedive_info(driver, group_name)
+        pd_index = load_pulsedive_index()
 
-            pulses = fetch_pulses(group_name)
-            store_pulses(driver, group_name, pulses, OTX_API_KEY)
-
-            print(f"Added all data for {group_name}")
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            list(executor.map(process_threat_group, repeat(driver), group_names.values(), repeat(pd_index)))
 
         driver.close()
         print("Connection Closed")
@@ -309,16 +407,9 @@ def store_threat_group_data():
 if __name__ == "__main__":
     # download_repo()
 
-    # Load Enterprise ATT&CK data
-    with open('cti/enterprise-attack/enterprise-attack.json', 'r') as f:
-        enterprise_data = parse(f.read(), allow_custom=True)
-
-    # Create an in-memory store
-    ms = MemoryStore()
-    ms.add(enterprise_data)
-
-    # Retrieve all intrusion sets (threat groups)
-    filter_obj = Filter('type', '=', 'intrusion-set')
-    threat_groups = ms.query(filter_obj)
+    # Stream the Enterprise ATT&CK bundle one object at a time and keep only the intrusion sets (threat groups),
+    # so the file and its thousands of other objects are never held in memory at once
+    with open('cti/enterprise-attack/enterprise-attack.json', 'rb') as f:
+        threat_groups = [obj for obj in ijson.items(f, 'objects.item') if obj.get('type') == 'intrusion-set']
 
     store_threat_group_data()
\ No newline at end of file